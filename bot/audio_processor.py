@@ -4,21 +4,242 @@ Handles audio search and download functionality.
 """
 
 import os
+import re
+import time
+import sqlite3
 import logging
 import asyncio
+import functools
+import multiprocessing
 import yt_dlp
 from typing import Dict, Optional
 import tempfile
 import hashlib
+from contextlib import closing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import CONCURRENT_DOWNLOADS
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of downloaded files kept around for repeat requests
+DOWNLOAD_CACHE_SIZE = 128
+
+# How long a search query -> video URL mapping stays valid
+SEARCH_CACHE_TTL = 7 * 86400
+
+class SearchCache:
+    """Persistent search query -> video URL cache backed by SQLite."""
+    
+    def __init__(self, db_path: str, ttl: int = SEARCH_CACHE_TTL):
+        """
+        Initialize the cache database.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            ttl: Entry lifetime in seconds
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache "
+                "(query TEXT PRIMARY KEY, url TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a short-lived connection, safe to use from any worker thread.
+        
+        Callers close it with contextlib.closing; using the connection itself as a
+        context manager only commits or rolls back.
+        """
+        return sqlite3.connect(self.db_path, timeout=5)
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Lowercase and collapse whitespace to maximize hit rate."""
+        return re.sub(r'\s+', ' ', query).strip().lower()
+    
+    def get(self, query: str) -> Optional[str]:
+        """
+        Get the cached video URL for a search query.
+        
+        Args:
+            query: Search query string
+            
+        Returns:
+            Video URL or None if missing or expired
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT url FROM search_cache WHERE query = ? AND expires_at > ?",
+                    (self.normalize(query), time.time())
+                ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache lookup failed: {e}")
+            return None
+    
+    def set(self, query: str, url: str):
+        """
+        Store the video URL for a search query.
+        
+        Args:
+            query: Search query string
+            url: Video URL
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                now = time.time()
+                # Expired rows are never read again, so drop them here to keep the table bounded
+                conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (query, url, expires_at) VALUES (?, ?, ?)",
+                    (self.normalize(query), url, now + self.ttl)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache store failed: {e}")
+    
+    def delete(self, query: str):
+        """
+        Drop a stale entry.
+        
+        Args:
+            query: Search query string
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM search_cache WHERE query = ?", (self.normalize(query),))
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache delete failed: {e}")
+
+# Per-worker-process state: one YoutubeDL per format selector, reused across downloads
+_ydl_pool: Dict[str, yt_dlp.YoutubeDL] = {}
+
+# Final file names reported by yt-dlp, keyed by video id
+_finished: Dict[str, str] = {}
+
+def _on_progress(d: Dict):
+    """Record where yt-dlp put each finished download."""
+    if d['status'] == 'finished':
+        _finished[d['info_dict']['id']] = d['filename']
+
+def _get_ydl(ydl_opts: Dict) -> yt_dlp.YoutubeDL:
+    """
+    Get the pooled YoutubeDL instance for these options, creating it on first use.
+    
+    Args:
+        ydl_opts: yt-dlp options
+        
+    Returns:
+        YoutubeDL instance with the output template from ydl_opts applied
+    """
+    ydl = _ydl_pool.get(ydl_opts['format'])
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({**ydl_opts, 'progress_hooks': [_on_progress]})
+        _ydl_pool[ydl_opts['format']] = ydl
+    ydl.params['outtmpl'] = {'default': ydl_opts['outtmpl']}
+    return ydl
+
+def _download_audio_standalone(search_query: str, ydl_opts: Dict,
+                               search_cache: SearchCache) -> Optional[str]:
+    """
+    Download audio using yt-dlp.
+    
+    Runs in a worker process, so it has to stay a picklable module-level function.
+    
+    Args:
+        search_query: Search query string
+        ydl_opts: yt-dlp options
+        search_cache: Persistent search result cache
+        
+    Returns:
+        Path to downloaded file or None
+    """
+    try:
+        ydl = _get_ydl(ydl_opts)
+        video_info = None
+        
+        # Skip the search if we already know which video to fetch
+        cached_url = search_cache.get(search_query)
+        if cached_url:
+            try:
+                video_info = ydl.extract_info(cached_url, download=True)
+            except Exception as e:
+                logger.warning(f"Cached video failed for {search_query}, searching again: {e}")
+                search_cache.delete(search_query)
+                video_info = None
+        
+        if not video_info:
+            # Search for the track and download the first result
+            search_results = ydl.extract_info(
+                f"ytsearch1:{search_query}",
+                download=True
+            )
+            
+            if not search_results or 'entries' not in search_results or not search_results['entries']:
+                logger.error(f"No search results found for: {search_query}")
+                return None
+            
+            # Get the first result
+            video_info = search_results['entries'][0]
+            
+            # Media URLs expire quickly, so remember the watch page instead
+            search_cache.set(search_query, video_info.get('webpage_url') or video_info['url'])
+        
+        # The progress hook already told us where the file ended up
+        file_path = _finished.pop(video_info['id'], None)
+        if not file_path:
+            logger.error(f"Downloaded file not found for: {search_query}")
+        return file_path
+        
+    except Exception as e:
+        logger.error(f"yt-dlp download error: {e}")
+        return None
+
 class AudioProcessor:
     """Handles audio search and download operations."""
     
+    __slots__ = ('download_dir', '_cache', '_cache_lock', '_pending', 'search_cache', '_pool',
+                 '_worker_slots', '_cleanup_q', '_cleanup_task')
+    
     def __init__(self):
-        """Initialize audio processor."""
+        """
+        Initialize audio processor.
+        
+        Creates nothing on disk and starts no processes: forkserver imports the main
+        module into its server process, which builds this module-level instance again.
+        The download directory, search cache and worker pool are set up by
+        _ensure_started on the first download instead.
+        """
+        self.download_dir: Optional[str] = None
+        # LRU of (name, artist, quality) -> downloaded file path
+        self._cache = OrderedDict()
+        self._cache_lock = asyncio.Lock()
+        # Downloads in progress, by cache key, for concurrent requests of the same track to share
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self.search_cache: Optional[SearchCache] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # One slot per pool worker; downloads wait here rather than in the pool's queue
+        self._worker_slots = asyncio.Semaphore(CONCURRENT_DOWNLOADS)
+        # Deletes are drained by a background task so they never block the event loop
+        self._cleanup_q: asyncio.Queue[str] = asyncio.Queue()
+        self._cleanup_task: Optional[asyncio.Task] = None
+    
+    def _ensure_started(self):
+        """Create the download directory, search cache and worker pool on first use."""
+        if self._pool is not None:
+            return
         self.download_dir = tempfile.mkdtemp(prefix="music_bot_")
+        # Search results outlive the per-run download directory
+        self.search_cache = SearchCache(
+            os.path.join(os.path.dirname(self.download_dir), "music_bot_ytsearch_cache.sqlite3")
+        )
+        # yt-dlp holds the GIL while extracting, so run it in separate processes
+        self._pool = self._create_pool()
         logger.info(f"Audio processor initialized with download directory: {self.download_dir}")
     
     async def download_track(self, track_info: Dict, quality: str) -> Optional[str]:
@@ -33,98 +254,197 @@ class AudioProcessor:
             Path to downloaded file or None if failed
         """
         try:
-            # Create search query
-            search_query = f"{track_info['name']} {track_info['artist']}"
-            logger.info(f"Searching for: {search_query}")
-            
-            # Configure yt-dlp options
-            ydl_opts = self._get_ydl_options(quality)
+            # Serve repeat requests straight from the download cache
+            cache_key = (track_info['name'].lower(), track_info['artist'].lower(), quality)
+            cached_path = await self._get_cached(cache_key)
+            if cached_path:
+                logger.info(f"Cache hit for: {track_info['name']} ({quality}kbps)")
+                return cached_path
             
-            # Generate unique filename
-            file_hash = hashlib.md5(search_query.encode()).hexdigest()[:8]
-            output_filename = f"{track_info['name']} - {track_info['artist']} [{file_hash}].%(ext)s"
-            ydl_opts['outtmpl'] = os.path.join(self.download_dir, output_filename)
+            # The same track and quality always goes to the same file, so wait for a
+            # download that is already running instead of racing it on that path
+            pending = self._pending.get(cache_key)
+            if pending is not None:
+                logger.info(f"Waiting for in-progress download of: {track_info['name']} ({quality}kbps)")
+                return await asyncio.shield(pending)
             
-            # Search and download with timeout
-            loop = asyncio.get_event_loop()
+            pending = self._pending[cache_key] = asyncio.get_running_loop().create_future()
+            file_path = None
             try:
-                file_path = await asyncio.wait_for(
-                    loop.run_in_executor(
-                        None, 
-                        self._download_audio, 
-                        search_query, 
-                        ydl_opts
-                    ),
-                    timeout=60  # 1 minute timeout
-                )
-                
-                if file_path and os.path.exists(file_path):
-                    logger.info(f"Successfully downloaded: {file_path}")
-                    return file_path
-                else:
-                    logger.error(f"Download failed for: {search_query}")
-                    return None
-                    
-            except asyncio.TimeoutError:
-                logger.error(f"Download timeout for: {search_query}")
-                return None
+                file_path = await self._download(track_info, quality, cache_key)
+                return file_path
+            finally:
+                del self._pending[cache_key]
+                pending.set_result(file_path)
                 
         except Exception as e:
             logger.error(f"Error downloading track {track_info['name']}: {e}")
             return None
     
-    def _download_audio(self, search_query: str, ydl_opts: Dict) -> Optional[str]:
+    async def _download(self, track_info: Dict, quality: str, cache_key: tuple) -> Optional[str]:
         """
-        Internal method to download audio using yt-dlp.
+        Search for and download a track in the worker pool, caching the result.
         
         Args:
-            search_query: Search query string
-            ydl_opts: yt-dlp options
+            track_info: Track information dictionary
+            quality: Quality preference (128, 192, 320)
+            cache_key: (name, artist, quality) tuple
             
         Returns:
-            Path to downloaded file or None
+            Path to downloaded file or None if failed
         """
+        self._ensure_started()
+        
+        # Create search query
+        search_query = f"{track_info['name']} {track_info['artist']}"
+        logger.info(f"Searching for: {search_query}")
+        
+        # Configure yt-dlp options
+        ydl_opts = self._get_ydl_options(quality)
+        
+        # Generate unique filename
+        file_hash = hashlib.blake2b(search_query.encode(), digest_size=4).hexdigest()
+        output_filename = f"{track_info['name']} - {track_info['artist']} [{file_hash}-{quality}].%(ext)s"
+        ydl_opts['outtmpl'] = os.path.join(self.download_dir, output_filename)
+        
+        # Search and download with timeout
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Search for the track
-                search_results = ydl.extract_info(
-                    f"ytsearch1:{search_query}",
-                    download=False
-                )
-                
-                if not search_results or 'entries' not in search_results or not search_results['entries']:
-                    logger.error(f"No search results found for: {search_query}")
-                    return None
-                
-                # Get the first result
-                video_info = search_results['entries'][0]
-                video_url = video_info['url']
-                
-                # Download the audio
-                ydl.download([video_url])
-                
-                # Find the downloaded file
-                expected_path = ydl.prepare_filename(video_info)
-                
-                # yt-dlp might change the extension, so find the actual file
-                base_path = os.path.splitext(expected_path)[0]
-                for ext in ['.mp3', '.m4a', '.webm', '.ogg']:
-                    potential_path = base_path + ext
-                    if os.path.exists(potential_path):
-                        return potential_path
-                
-                # If exact match not found, look in download directory
-                for file in os.listdir(self.download_dir):
-                    if file.startswith(os.path.basename(base_path)):
-                        return os.path.join(self.download_dir, file)
-                
-                logger.error(f"Downloaded file not found for: {search_query}")
+            future = await self._submit_download(search_query, ydl_opts)
+            file_path = await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout=60  # 1 minute timeout, counted from when a worker picks it up
+            )
+            
+            if file_path and os.path.exists(file_path):
+                logger.info(f"Successfully downloaded: {file_path}")
+                await self._store_cached(cache_key, file_path)
+                return file_path
+            else:
+                logger.error(f"Download failed for: {search_query}")
                 return None
                 
-        except Exception as e:
-            logger.error(f"yt-dlp download error: {e}")
+        except asyncio.TimeoutError:
+            logger.error(f"Download timeout for: {search_query}")
+            return None
+        
+        except BrokenProcessPool:
+            # A worker died mid-download; _replace_pool has already started fresh workers
+            logger.error(f"Download worker crashed for: {search_query}")
             return None
     
+    async def _submit_download(self, search_query: str, ydl_opts: Dict) -> asyncio.Future:
+        """
+        Hand a download to the worker pool once one of its workers is free.
+        
+        The pool is shared by every user, so waiting for a slot here keeps queue time
+        out of the download timeout. The slot is only released when the worker has
+        actually finished, even if the caller gave up waiting before that.
+        
+        Args:
+            search_query: Search query string
+            ydl_opts: yt-dlp options
+            
+        Returns:
+            Future resolving to the downloaded file path or None
+        """
+        await self._worker_slots.acquire()
+        pool = self._pool
+        try:
+            future = asyncio.wrap_future(pool.submit(
+                _download_audio_standalone,
+                search_query,
+                ydl_opts,
+                self.search_cache
+            ))
+        except BaseException as e:
+            self._worker_slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool)
+            raise
+        future.add_done_callback(functools.partial(self._on_download_done, pool))
+        return future
+    
+    def _on_download_done(self, pool: ProcessPoolExecutor, future: asyncio.Future):
+        """
+        Free the worker slot taken by a finished download.
+        
+        Args:
+            pool: The pool the download was submitted to
+            future: The download's future
+        """
+        self._worker_slots.release()
+        if future.cancelled():
+            return
+        # Also marks the outcome as seen in case the caller timed out and stopped waiting
+        if isinstance(future.exception(), BrokenProcessPool):
+            self._replace_pool(pool)
+    
+    def _replace_pool(self, pool: ProcessPoolExecutor):
+        """
+        Swap a broken worker pool for a fresh one.
+        
+        Every download in flight on the broken pool fails the same way, so only the
+        first one to report it does the swap.
+        
+        Args:
+            pool: The pool that broke
+        """
+        if self._pool is pool:
+            self._pool = self._create_pool()
+            pool.shutdown(wait=False)
+    
+    @staticmethod
+    def _create_pool() -> ProcessPoolExecutor:
+        """
+        Create the download worker pool.
+        
+        forkserver workers start from a clean, preloaded server process instead of
+        forking the running event loop or re-importing yt-dlp for every worker.
+        
+        Returns:
+            Process pool executor
+        """
+        return ProcessPoolExecutor(
+            max_workers=CONCURRENT_DOWNLOADS,
+            mp_context=multiprocessing.get_context('forkserver')
+        )
+    
+    async def _get_cached(self, cache_key: tuple) -> Optional[str]:
+        """
+        Look up a previously downloaded file.
+        
+        Args:
+            cache_key: (name, artist, quality) tuple
+            
+        Returns:
+            Cached file path if it still exists on disk, None otherwise
+        """
+        async with self._cache_lock:
+            file_path = self._cache.get(cache_key)
+            if file_path is None:
+                return None
+            if not os.path.exists(file_path):
+                del self._cache[cache_key]
+                return None
+            self._cache.move_to_end(cache_key)
+            return file_path
+    
+    async def _store_cached(self, cache_key: tuple, file_path: str):
+        """
+        Remember a downloaded file, evicting the least recently used one.
+        
+        Args:
+            cache_key: (name, artist, quality) tuple
+            file_path: Path to the downloaded file
+        """
+        async with self._cache_lock:
+            self._cache[cache_key] = file_path
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > DOWNLOAD_CACHE_SIZE:
+                _, evicted_path = self._cache.popitem(last=False)
+                if evicted_path not in self._cache.values():
+                    self.schedule_cleanup(evicted_path)
+    
     def _get_ydl_options(self, quality: str) -> Dict:
         """
         Get yt-dlp options based on quality preference.
@@ -151,6 +471,8 @@ class AudioProcessor:
             'http_chunk_size': 10485760,  # 10 MB chunks
             'retries': 2,
             'fragment_retries': 2,
+            # Only affects fragmented (DASH/HLS) fallbacks; plain https audio is one request
+            'concurrent_fragment_downloads': 4,
         }
         
         # Skip post-processing for faster downloads - send raw audio
@@ -166,6 +488,41 @@ class AudioProcessor:
         
         return ydl_opts
     
+    async def discard(self, file_path: str):
+        """
+        Forget a downloaded file and delete it, e.g. when it is too large to send.
+        
+        The cache entry goes first so no later request is handed a path that the
+        cleanup worker is about to delete.
+        
+        Args:
+            file_path: Path to the downloaded file
+        """
+        async with self._cache_lock:
+            for cache_key in [key for key, path in self._cache.items() if path == file_path]:
+                del self._cache[cache_key]
+        self.schedule_cleanup(file_path)
+    
+    def schedule_cleanup(self, file_path: str):
+        """
+        Queue a file for deletion by the background cleanup worker.
+        
+        Must be called from the event loop.
+        
+        Args:
+            file_path: Path to file to be cleaned up
+        """
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_worker())
+        self._cleanup_q.put_nowait(file_path)
+    
+    async def _cleanup_worker(self):
+        """Delete queued files off the event loop."""
+        while True:
+            file_path = await self._cleanup_q.get()
+            await asyncio.to_thread(self.cleanup_file, file_path)
+            self._cleanup_q.task_done()
+    
     def cleanup_file(self, file_path: str):
         """
         Clean up downloaded file.
@@ -182,10 +539,23 @@ class AudioProcessor:
     
     def cleanup_all(self):
         """Clean up all downloaded files."""
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+        self._cache.clear()
+        if self._pool is None:
+            # Nothing was ever downloaded
+            return
+        self._pool.shutdown(wait=False)
         try:
-            for file in os.listdir(self.download_dir):
-                file_path = os.path.join(self.download_dir, file)
-                self.cleanup_file(file_path)
+            # One unlink per entry; scandir needs no separate exists() check
+            with os.scandir(self.download_dir) as entries:
+                for entry in entries:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"Failed to cleanup file {entry.path}: {e}")
             os.rmdir(self.download_dir)
             logger.info("All files cleaned up successfully")
         except Exception as e:
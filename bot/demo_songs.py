@@ -11,9 +11,11 @@ logger = logging.getLogger(__name__)
 class DemoSongs:
     """Manages demo song URLs for testing."""
     
+    __slots__ = ('demo_urls', '_demo_set')
+    
     def __init__(self):
         """Initialize with popular demo songs."""
-        self.demo_urls = [
+        demo_urls = [
             "https://open.spotify.com/track/4iV5W9uYEdYUVa79Axb7Rh",  # Never Gonna Give You Up - Rick Astley
             "https://open.spotify.com/track/0VjIjW4GlULA8KFjAl1kgK",  # Blinding Lights - The Weeknd
             "https://open.spotify.com/track/11dFghVXANMlKmJXsNCbNl",  # Rather Be - Clean Bandit
@@ -36,8 +38,11 @@ class DemoSongs:
             "https://open.spotify.com/track/4iJyoBOLtHqaGxP12qzhQI",  # Roar - Katy Perry
         ]
         
-        # Shuffle the list initially
-        random.shuffle(self.demo_urls)
+        # Shuffle the list initially; stored as a tuple since it is read far more than changed
+        random.shuffle(demo_urls)
+        self.demo_urls = tuple(demo_urls)
+        # Companion set for O(1) membership checks
+        self._demo_set = set(self.demo_urls)
         logger.info(f"Demo songs initialized with {len(self.demo_urls)} songs")
     
     def get_random_demo_url(self) -> str:
@@ -65,7 +70,7 @@ class DemoSongs:
     
     def refresh_demo_list(self):
         """Shuffle the demo list for variety."""
-        random.shuffle(self.demo_urls)
+        self.demo_urls = tuple(random.sample(self.demo_urls, len(self.demo_urls)))
         logger.info("Demo song list refreshed")
     
     def add_demo_song(self, url: str):
@@ -75,8 +80,9 @@ class DemoSongs:
         Args:
             url: Spotify URL to add
         """
-        if url not in self.demo_urls:
-            self.demo_urls.append(url)
+        if url not in self._demo_set:
+            self.demo_urls += (url,)
+            self._demo_set.add(url)
             logger.info(f"Added new demo song: {url}")
         else:
             logger.info(f"Demo song already exists: {url}")
@@ -88,8 +94,9 @@ class DemoSongs:
         Args:
             url: Spotify URL to remove
         """
-        if url in self.demo_urls:
-            self.demo_urls.remove(url)
+        if url in self._demo_set:
+            self.demo_urls = tuple(u for u in self.demo_urls if u != url)
+            self._demo_set.discard(url)
             logger.info(f"Removed demo song: {url}")
         else:
             logger.warning(f"Demo song not found: {url}")
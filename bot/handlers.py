@@ -4,20 +4,34 @@ Contains all command and callback handlers for the music bot.
 """
 
 import logging
+import os
 import re
 import asyncio
+import time
+from pathlib import Path
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import RetryAfter
 
 from .spotify_client import SpotifyClient
 from .audio_processor import AudioProcessor
 from .demo_songs import DemoSongs
-from .utils import create_quality_keyboard, create_main_keyboard, extract_spotify_id
-from config import BOT_WELCOME, BOT_HELP, QUALITY_OPTIONS
+from .utils import create_quality_keyboard, create_main_keyboard, format_file_size, SPOTIFY_URL_RE
+from config import (
+    BOT_WELCOME, BOT_HELP, BOT_TRACK_FOUND, QUALITY_OPTIONS, CONCURRENT_DOWNLOADS, MAX_UPLOAD_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
+# Progress edits are sent every 10% or, failing that, every 2 seconds
+PROGRESS_UPDATE_STEP = 10
+PROGRESS_UPDATE_INTERVAL = 2.0
+
+# Every possible 10-step progress bar, indexed by filled steps
+PROGRESS_BARS = tuple('█' * i + '░' * (10 - i) for i in range(11))
+
 # Initialize components
 spotify_client = SpotifyClient()
 audio_processor = AudioProcessor()
@@ -47,9 +61,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming text messages (URLs)."""
     message_text = update.message.text.strip()
     
-    # Check if it's a Spotify URL
-    if "spotify.com" in message_text:
-        await handle_spotify_url(update, context, message_text)
+    # One search both recognizes a Spotify link or URI and extracts its type and ID
+    match = SPOTIFY_URL_RE.search(message_text)
+    if match:
+        await handle_spotify_url(update, context, match.group('type'), match.group('id'))
+    elif "spotify.com" in message_text:
+        # A Spotify link we can't download, such as an artist page
+        await handle_spotify_url(update, context, None, None)
     else:
         # Guide user to use proper links
         keyboard = [[InlineKeyboardButton("🎪 Try Demo", callback_data="try_demo")]]
@@ -60,8 +78,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
-async def handle_spotify_url(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str):
-    """Process Spotify URLs and initiate download flow."""
+async def handle_spotify_url(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                             content_type: Optional[str], spotify_id: Optional[str]):
+    """Process a matched Spotify link and initiate download flow."""
     # Send processing message
     processing_msg = await update.message.reply_text(
         "🔍 *Analyzing your request...*\n\n"
@@ -70,9 +89,6 @@ async def handle_spotify_url(update: Update, context: ContextTypes.DEFAULT_TYPE,
     )
     
     try:
-        # Extract Spotify ID and type
-        spotify_id, content_type = extract_spotify_id(url)
-        
         if content_type == "track":
             await handle_single_track(update, context, spotify_id, processing_msg)
         elif content_type == "playlist":
@@ -116,11 +132,7 @@ async def handle_single_track(update: Update, context: ContextTypes.DEFAULT_TYPE
         keyboard = create_quality_keyboard(track_id)
         
         await processing_msg.edit_text(
-            f"🎶 *Found your track!*\n\n"
-            f"🎤 **{track_info['name']}**\n"
-            f"👨‍🎤 *by {track_info['artist']}*\n"
-            f"⏱️ *Duration: {track_info['duration']}*\n\n"
-            f"🎯 *Choose your preferred quality:*",
+            BOT_TRACK_FOUND.format_map(track_info),
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
@@ -236,22 +248,16 @@ async def handle_button_callback(update: Update, context: ContextTypes.DEFAULT_T
     
     callback_data = query.data
     
-    if callback_data == "main_menu":
-        await show_main_menu(query, context)
-    elif callback_data == "help":
-        await show_help_info(query, context)
-    elif callback_data == "try_demo":
-        await show_demo_options(query, context)
-    elif callback_data == "get_demo_url":
-        await provide_demo_url(query, context)
-    elif callback_data == "share_bot":
-        await show_share_info(query, context)
-    elif callback_data.startswith("quality_"):
-        await handle_quality_selection(query, context)
-    elif callback_data.startswith("download_"):
-        await handle_download_request(query, context)
-    elif callback_data == "cancel_download":
-        await cancel_download(query, context)
+    # Fixed actions dispatch with one dict lookup
+    handler = _EXACT_HANDLERS.get(callback_data)
+    if handler is None:
+        # Parameterized actions carry their arguments after the prefix
+        match = _PREFIX_RE.match(callback_data)
+        if match:
+            handler = _PREFIX_HANDLERS[match.group(1)]
+    
+    if handler:
+        await handler(query, context)
     else:
         await query.message.reply_text("🤔 Unknown action. Please try again!")
 
@@ -339,6 +345,34 @@ async def handle_quality_selection(query, context):
     # Start download
     await start_track_download(query, context, track_info, quality)
 
+async def send_track_audio(context, chat_id, file_path, track_info, caption):
+    """
+    Upload a downloaded track to a chat.
+    
+    The file is read in a worker thread and handed over as bytes, so the event
+    loop never blocks on disk and no file handle outlives the call.
+    
+    Args:
+        context: Bot context
+        chat_id: Chat to send the audio to
+        file_path: Path to the downloaded audio file
+        track_info: Track information dictionary
+        caption: Markdown caption for the audio message
+    """
+    audio_file = Path(file_path)
+    audio_data = await asyncio.to_thread(audio_file.read_bytes)
+    
+    await context.bot.send_audio(
+        chat_id=chat_id,
+        audio=audio_data,
+        filename=audio_file.name,
+        title=track_info['name'],
+        performer=track_info['artist'],
+        duration=track_info['duration_ms'] // 1000,
+        caption=caption,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
 async def start_track_download(query, context, track_info, quality):
     """Start downloading a single track."""
     # Remove keyboard (bubble effect)
@@ -356,15 +390,25 @@ async def start_track_download(query, context, track_info, quality):
         file_path = await audio_processor.download_track(track_info, quality)
         
         if file_path:
+            # Telegram would reject it only after a full upload, so check the size first
+            file_size = os.path.getsize(file_path)
+            if file_size > MAX_UPLOAD_SIZE:
+                logger.warning(f"File too large to send ({file_size} bytes): {file_path}")
+                await audio_processor.discard(file_path)
+                await query.edit_message_text(
+                    f"📦 *File too large!*\n\n"
+                    f"🎶 **{track_info['name']}**\n"
+                    f"👨‍🎤 *by {track_info['artist']}*\n\n"
+                    f"The audio is {format_file_size(file_size)}, above Telegram's "
+                    f"{format_file_size(MAX_UPLOAD_SIZE)} upload limit. Try a lower quality! 🎯",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                return
+            
             # Send the file
-            await context.bot.send_audio(
-                chat_id=query.message.chat_id,
-                audio=open(file_path, 'rb'),
-                title=track_info['name'],
-                performer=track_info['artist'],
-                duration=track_info['duration_ms'] // 1000,
-                caption=f"🎶 **{track_info['name']}** by *{track_info['artist']}*",
-                parse_mode=ParseMode.MARKDOWN
+            await send_track_audio(
+                context, query.message.chat_id, file_path, track_info,
+                caption=f"🎶 **{track_info['name']}** by *{track_info['artist']}*"
             )
             
             # Update message to show completion
@@ -406,6 +450,109 @@ async def handle_download_request(query, context):
             if album_info:
                 await start_album_download(query, context, album_info, quality)
 
+async def download_tracks(query, context, tracks, quality, progress_header, caption_footer):
+    """
+    Download tracks concurrently and upload each one as soon as it is ready.
+    
+    Downloads feed a bounded queue drained by a single uploader, so network
+    downloads overlap with Telegram uploads. A separate reporter task edits
+    the progress message from a shared counter.
+    
+    Args:
+        query: Callback query whose message shows the progress
+        context: Bot context
+        tracks: List of track information dictionaries
+        quality: Quality preference (128, 192, 320)
+        progress_header: Markdown header shown above the progress line
+        caption_footer: Markdown line appended to every audio caption
+        
+    Returns:
+        Number of tracks sent successfully
+    """
+    total_tracks = len(tracks)
+    semaphore = asyncio.Semaphore(CONCURRENT_DOWNLOADS)
+    # Small buffer between the stages so finished downloads can't pile up unsent
+    ready = asyncio.Queue(maxsize=2)
+    # Latest position, handed from the uploader to the progress reporter
+    progress = {'done': 0, 'track': None}
+    progress_changed = asyncio.Event()
+    
+    async def download_one(track):
+        async with semaphore:
+            file_path = None
+            try:
+                file_path = await audio_processor.download_track(track, quality)
+            finally:
+                # Hold the download slot until the uploader has room
+                await ready.put((track, file_path))
+    
+    async def downloader():
+        results = await asyncio.gather(*(download_one(track) for track in tracks), return_exceptions=True)
+        for track, result in zip(tracks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error downloading track {track['name']}: {result}")
+    
+    async def uploader():
+        success_count = 0
+        for i in range(1, total_tracks + 1):
+            track, file_path = await ready.get()
+            progress['done'], progress['track'] = i, track
+            progress_changed.set()
+            try:
+                if file_path and os.path.getsize(file_path) > MAX_UPLOAD_SIZE:
+                    logger.warning(f"Skipping track too large to send: {file_path}")
+                    await audio_processor.discard(file_path)
+                elif file_path:
+                    await send_track_audio(
+                        context, query.message.chat_id, file_path, track,
+                        caption=f"💎 **{track['name']}** by *{track['artist']}*\n{caption_footer}"
+                    )
+                    success_count += 1
+                    
+            except Exception as e:
+                logger.error(f"Error downloading track {track['name']}: {e}")
+                continue
+        
+        return success_count
+    
+    async def reporter():
+        last_update = time.monotonic()
+        last_pct = 0
+        shown = 0
+        while shown < total_tracks:
+            await progress_changed.wait()
+            progress_changed.clear()
+            shown, track = progress['done'], progress['track']
+            
+            # Throttle progress edits, but always show the last track
+            now = time.monotonic()
+            pct = shown * 100 // total_tracks
+            if not (shown == total_tracks or pct - last_pct >= PROGRESS_UPDATE_STEP
+                    or now - last_update >= PROGRESS_UPDATE_INTERVAL):
+                continue
+            
+            # pct // 10 equals shown * 10 // total_tracks, so one division serves both
+            bar = PROGRESS_BARS[pct // 10]
+            try:
+                await query.edit_message_text(
+                    f"{progress_header}"
+                    f"🎶 *Track {shown}/{total_tracks}*\n"
+                    f"🔥 **{track['name']}** by *{track['artist']}*\n\n"
+                    f"Progress: {bar} {pct}%",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except RetryAfter as e:
+                logger.warning(f"Progress update rate limited, waiting {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.error(f"Error updating progress: {e}")
+            last_update = now
+            last_pct = pct
+    
+    # Downloads keep running while earlier tracks are uploaded; progress edits never hold up either
+    _, success_count, _ = await asyncio.gather(downloader(), uploader(), reporter())
+    return success_count
+
 async def start_playlist_download(query, context, playlist_info, quality):
     """Start downloading playlist tracks with selected quality."""
     tracks = playlist_info['tracks']
@@ -420,36 +567,11 @@ async def start_playlist_download(query, context, playlist_info, quality):
         parse_mode=ParseMode.MARKDOWN
     )
     
-    success_count = 0
-    for i, track in enumerate(tracks, 1):
-        try:
-            # Update progress
-            await query.edit_message_text(
-                f"💫 *Downloading Playlist*\n\n"
-                f"🎧 **{playlist_info['name']}**\n"
-                f"🎶 *Track {i}/{total_tracks}*\n"
-                f"🔥 **{track['name']}** by *{track['artist']}*\n\n"
-                f"Progress: {'█' * (i * 10 // total_tracks)}{'░' * (10 - i * 10 // total_tracks)} {i * 100 // total_tracks}%",
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-            # Download track with selected quality
-            file_path = await audio_processor.download_track(track, quality)
-            
-            if file_path:
-                await context.bot.send_audio(
-                    chat_id=query.message.chat_id,
-                    audio=open(file_path, 'rb'),
-                    title=track['name'],
-                    performer=track['artist'],
-                    caption=f"💎 **{track['name']}** by *{track['artist']}*\n🎧 From playlist: *{playlist_info['name']}*",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                success_count += 1
-                
-        except Exception as e:
-            logger.error(f"Error downloading track {track['name']}: {e}")
-            continue
+    success_count = await download_tracks(
+        query, context, tracks, quality,
+        progress_header=f"💫 *Downloading Playlist*\n\n🎧 **{playlist_info['name']}**\n",
+        caption_footer=f"🎧 From playlist: *{playlist_info['name']}*"
+    )
     
     # Final summary
     await query.edit_message_text(
@@ -474,36 +596,11 @@ async def start_album_download(query, context, album_info, quality):
         parse_mode=ParseMode.MARKDOWN
     )
     
-    success_count = 0
-    for i, track in enumerate(tracks, 1):
-        try:
-            # Update progress
-            await query.edit_message_text(
-                f"💫 *Downloading Album*\n\n"
-                f"💽 **{album_info['name']}**\n"
-                f"🎶 *Track {i}/{total_tracks}*\n"
-                f"🔥 **{track['name']}** by *{track['artist']}*\n\n"
-                f"Progress: {'█' * (i * 10 // total_tracks)}{'░' * (10 - i * 10 // total_tracks)} {i * 100 // total_tracks}%",
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-            # Download track with selected quality
-            file_path = await audio_processor.download_track(track, quality)
-            
-            if file_path:
-                await context.bot.send_audio(
-                    chat_id=query.message.chat_id,
-                    audio=open(file_path, 'rb'),
-                    title=track['name'],
-                    performer=track['artist'],
-                    caption=f"💎 **{track['name']}** by *{track['artist']}*\n💽 From album: *{album_info['name']}*",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                success_count += 1
-                
-        except Exception as e:
-            logger.error(f"Error downloading track {track['name']}: {e}")
-            continue
+    success_count = await download_tracks(
+        query, context, tracks, quality,
+        progress_header=f"💫 *Downloading Album*\n\n💽 **{album_info['name']}**\n",
+        caption_footer=f"💽 From album: *{album_info['name']}*"
+    )
     
     # Final summary
     await query.edit_message_text(
@@ -521,3 +618,20 @@ async def cancel_download(query, context):
         "No worries! Feel free to try again anytime. 🎵",
         parse_mode=ParseMode.MARKDOWN
     )
+
+# Callback routing tables, defined after the handlers they reference
+_EXACT_HANDLERS = {
+    "main_menu": show_main_menu,
+    "help": show_help_info,
+    "try_demo": show_demo_options,
+    "get_demo_url": provide_demo_url,
+    "share_bot": show_share_info,
+    "cancel_download": cancel_download,
+}
+
+_PREFIX_RE = re.compile(r"^(quality|download)_")
+
+_PREFIX_HANDLERS = {
+    "quality": handle_quality_selection,
+    "download": handle_download_request,
+}
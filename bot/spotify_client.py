@@ -5,20 +5,180 @@ Handles all Spotify API interactions for metadata extraction.
 
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+import sys
+import time
+import atexit
+import weakref
+import threading
 import logging
 import asyncio
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
 
 logger = logging.getLogger(__name__)
 
+# Spotify returns at most 100 playlist items per request
+PLAYLIST_PAGE_SIZE = 100
+
+# Worker threads for blocking spotipy calls, kept small to respect Spotify's rate limits
+SPOTIFY_MAX_WORKERS = 4
+
+# Refresh the access token this many seconds before Spotify expires it
+TOKEN_REFRESH_MARGIN = 60
+
+# Only the playlist item fields used to build track info
+PLAYLIST_ITEM_FIELDS = "items(track(id,name,type,artists(id,name),album(id,name),duration_ms,popularity))"
+
+# Only the playlist fields used to build playlist info, including the first page of items
+PLAYLIST_FIELDS = (
+    "id,name,description,owner(display_name),followers(total),images(url),"
+    f"tracks(total,{PLAYLIST_ITEM_FIELDS})"
+)
+
+# Metadata cache sizes and lifetimes in seconds; search results go stale faster
+METADATA_CACHE_SIZE = 1024
+METADATA_CACHE_TTL = 3600
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300
+
+def _artist_names(artists: List[Dict]) -> str:
+    """
+    Join artist names with commas.
+    
+    Args:
+        artists: Spotify artist objects
+        
+    Returns:
+        Comma-separated artist names
+    """
+    # Most tracks have a single artist, which needs no join at all
+    if len(artists) == 1:
+        return artists[0]['name']
+    return ', '.join(artist['name'] for artist in artists)
+
+def _join_artists(artists: List[Dict], cache: Dict) -> str:
+    """
+    Join artist names once per distinct artist lineup.
+    
+    Args:
+        artists: Spotify artist objects
+        cache: Per-call cache shared across the tracks of one playlist or album
+        
+    Returns:
+        Interned, comma-separated artist names
+    """
+    # Local files have no artist IDs, so fall back to the name
+    key = tuple(artist['id'] or artist['name'] for artist in artists)
+    joined = cache.get(key)
+    if joined is None:
+        joined = cache[key] = sys.intern(_artist_names(artists))
+    return joined
+
+class CachedClientCredentials(SpotifyClientCredentials):
+    """Client-credentials manager that serves the access token from memory until near expiry."""
+    
+    def __init__(self, *args, **kwargs):
+        """Initialize with the same arguments as SpotifyClientCredentials."""
+        super().__init__(*args, **kwargs)
+        self._token = None
+        self._token_refresh_at = 0.0
+        self._token_lock = threading.Lock()
+    
+    def get_access_token(self, as_dict=False, check_cache=True):
+        """
+        Get the access token, skipping spotipy's cache and expiry checks while it is fresh.
+        
+        Args:
+            as_dict: Return spotipy's full token info dict instead of the token string (deprecated)
+            check_cache: Let spotipy reuse its cached token when refreshing
+            
+        Returns:
+            Access token string, or token info dict if as_dict is set
+        """
+        if not as_dict and time.monotonic() < self._token_refresh_at:
+            return self._token
+        
+        with self._token_lock:
+            # Another worker thread may have refreshed it while we waited
+            if not as_dict and time.monotonic() < self._token_refresh_at:
+                return self._token
+            
+            self._token = super().get_access_token(as_dict=False, check_cache=check_cache)
+            # spotipy stores the token with its expiry in the cache handler
+            token_info = self.cache_handler.get_cached_token()
+            if token_info and token_info.get('access_token') == self._token:
+                remaining = token_info['expires_at'] - time.time()
+                self._token_refresh_at = time.monotonic() + remaining - TOKEN_REFRESH_MARGIN
+            else:
+                # Expiry unknown, so ask spotipy again next time
+                self._token_refresh_at = 0.0
+        
+        return token_info if as_dict else self._token
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a fixed lifetime."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            maxsize: Maximum number of entries
+            ttl: Entry lifetime in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+    
+    def get(self, key):
+        """
+        Get a cached value.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached value or None if missing or expired
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entries over maxsize.
+        
+        Args:
+            key: Cache key
+            value: Value to cache
+        """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
 class SpotifyClient:
     """Client for interacting with Spotify Web API."""
     
     def __init__(self):
         """Initialize Spotify client with credentials."""
+        self._executor = ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS, thread_name_prefix="spotify")
+        atexit.register(self._executor.shutdown)
+        self._metadata_cache = TTLCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+        self._search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        # One lock per in-flight key so concurrent identical lookups hit Spotify once
+        self._key_locks = weakref.WeakValueDictionary()
         try:
-            client_credentials_manager = SpotifyClientCredentials(
+            client_credentials_manager = CachedClientCredentials(
                 client_id=SPOTIFY_CLIENT_ID,
                 client_secret=SPOTIFY_CLIENT_SECRET
             )
@@ -28,9 +188,122 @@ class SpotifyClient:
             logger.error(f"Failed to initialize Spotify client: {e}")
             self.sp = None
     
+    async def _call(self, fn, *args, **kwargs):
+        """
+        Run a blocking spotipy call on the client's thread pool.
+        
+        Args:
+            fn: spotipy method to call
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+            
+        Returns:
+            Result of fn
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+    
+    async def _cached(self, cache: TTLCache, key: tuple, fetch):
+        """
+        Return a cached value, or fetch and cache it once across concurrent callers.
+        
+        Args:
+            cache: Cache to use
+            key: Cache key covering every argument of the call
+            fetch: Zero-argument coroutine function producing the value
+            
+        Returns:
+            Cached or freshly fetched value; empty results are not cached
+        """
+        value = cache.get(key)
+        if value is not None:
+            return value
+        
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have fetched it while we waited
+            value = cache.get(key)
+            if value is None:
+                value = await fetch()
+                if value:
+                    cache.set(key, value)
+        return value
+    
     async def get_track_info(self, track_id: str) -> Optional[Dict]:
         """
-        Get track information from Spotify.
+        Get track information from Spotify, cached for an hour.
+        
+        Args:
+            track_id: Spotify track ID
+            
+        Returns:
+            Dictionary containing track information or None if failed
+        """
+        return await self._cached(
+            self._metadata_cache, ('track', track_id),
+            lambda: self._fetch_track_info(track_id)
+        )
+    
+    async def get_playlist_info(self, playlist_id: str) -> Optional[Dict]:
+        """
+        Get playlist information from Spotify, cached per playlist snapshot.
+        
+        Args:
+            playlist_id: Spotify playlist ID
+            
+        Returns:
+            Dictionary containing playlist information or None if failed
+        """
+        if not self.sp:
+            logger.error("Spotify client not initialized")
+            return None
+        
+        try:
+            # The snapshot ID changes whenever the playlist is edited
+            snapshot = await self._call(self.sp.playlist, playlist_id, fields='snapshot_id')
+        except Exception as e:
+            logger.error(f"Error retrieving playlist snapshot for {playlist_id}: {e}")
+            return None
+        
+        return await self._cached(
+            self._metadata_cache, ('playlist', playlist_id, snapshot['snapshot_id']),
+            lambda: self._fetch_playlist_info(playlist_id)
+        )
+    
+    async def get_album_info(self, album_id: str) -> Optional[Dict]:
+        """
+        Get album information from Spotify, cached for an hour.
+        
+        Args:
+            album_id: Spotify album ID
+            
+        Returns:
+            Dictionary containing album information or None if failed
+        """
+        return await self._cached(
+            self._metadata_cache, ('album', album_id),
+            lambda: self._fetch_album_info(album_id)
+        )
+    
+    async def search_track(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Search for tracks on Spotify, cached for a few minutes.
+        
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            
+        Returns:
+            List of track dictionaries
+        """
+        return await self._cached(
+            self._search_cache, ('search', query, limit),
+            lambda: self._fetch_search_results(query, limit)
+        )
+    
+    async def _fetch_track_info(self, track_id: str) -> Optional[Dict]:
+        """
+        Fetch track information from Spotify.
         
         Args:
             track_id: Spotify track ID
@@ -44,18 +317,11 @@ class SpotifyClient:
             
         try:
             # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            track = await loop.run_in_executor(None, self.sp.track, track_id)
+            track = await self._call(self.sp.track, track_id)
             
             # Extract relevant information
             track_info = {
-                'id': track['id'],
-                'name': track['name'],
-                'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                'album': track['album']['name'],
-                'duration': self._format_duration(track['duration_ms']),
-                'duration_ms': track['duration_ms'],
-                'popularity': track['popularity'],
+                **self._make_track_info(track),
                 'preview_url': track.get('preview_url'),
                 'external_urls': track['external_urls'],
                 'release_date': track['album']['release_date'],
@@ -69,9 +335,9 @@ class SpotifyClient:
             logger.error(f"Error retrieving track info for {track_id}: {e}")
             return None
     
-    async def get_playlist_info(self, playlist_id: str) -> Optional[Dict]:
+    async def _fetch_playlist_info(self, playlist_id: str) -> Optional[Dict]:
         """
-        Get playlist information from Spotify.
+        Fetch playlist information from Spotify.
         
         Args:
             playlist_id: Spotify playlist ID
@@ -84,35 +350,44 @@ class SpotifyClient:
             return None
             
         try:
-            loop = asyncio.get_event_loop()
-            
             # Get playlist basic info
-            playlist = await loop.run_in_executor(None, self.sp.playlist, playlist_id)
+            playlist = await self._call(self.sp.playlist, playlist_id, fields=PLAYLIST_FIELDS)
             
-            # Get all tracks (handle pagination)
-            tracks = []
-            results = playlist['tracks']
+            # The first page comes with the playlist; fetch the rest concurrently by offset.
+            # At most SPOTIFY_MAX_WORKERS pages are in flight, bounded by the thread pool.
+            first_page = playlist['tracks']
+            offsets = range(len(first_page['items']), first_page['total'], PLAYLIST_PAGE_SIZE)
+            pages = [first_page] + list(await asyncio.gather(*(
+                self._call(
+                    self.sp.playlist_items,
+                    playlist_id,
+                    fields=PLAYLIST_ITEM_FIELDS,
+                    limit=PLAYLIST_PAGE_SIZE,
+                    offset=offset,
+                    additional_types=('track',)
+                )
+                for offset in offsets
+            )))
             
-            while results:
-                for item in results['items']:
+            # Collect tracks in playlist order, sharing repeated artist and album strings
+            tracks = []
+            artist_cache = {}
+            album_cache = {}
+            for page in pages:
+                for item in page['items']:
                     if item['track'] and item['track']['type'] == 'track':
                         track = item['track']
-                        track_info = {
-                            'id': track['id'],
-                            'name': track['name'],
-                            'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                            'album': track['album']['name'],
-                            'duration': self._format_duration(track['duration_ms']),
-                            'duration_ms': track['duration_ms'],
-                            'popularity': track['popularity']
-                        }
+                        album = track['album']
+                        album_key = album['id'] or album['name']
+                        album_name = album_cache.get(album_key)
+                        if album_name is None:
+                            album_name = album_cache[album_key] = sys.intern(album['name'])
+                        track_info = self._make_track_info(
+                            track,
+                            artist=_join_artists(track['artists'], artist_cache),
+                            album_name=album_name
+                        )
                         tracks.append(track_info)
-                
-                # Get next page if available
-                if results['next']:
-                    results = await loop.run_in_executor(None, self.sp.next, results)
-                else:
-                    results = None
             
             playlist_info = {
                 'id': playlist['id'],
@@ -132,9 +407,9 @@ class SpotifyClient:
             logger.error(f"Error retrieving playlist info for {playlist_id}: {e}")
             return None
     
-    async def get_album_info(self, album_id: str) -> Optional[Dict]:
+    async def _fetch_album_info(self, album_id: str) -> Optional[Dict]:
         """
-        Get album information from Spotify.
+        Fetch album information from Spotify.
         
         Args:
             album_id: Spotify album ID
@@ -147,21 +422,19 @@ class SpotifyClient:
             return None
             
         try:
-            loop = asyncio.get_event_loop()
-            
             # Get album info
-            album = await loop.run_in_executor(None, self.sp.album, album_id)
+            album = await self._call(self.sp.album, album_id)
             
             # Extract track information
             tracks = []
+            artist_cache = {}
             for track in album['tracks']['items']:
                 track_info = {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                    'album': album['name'],
-                    'duration': self._format_duration(track['duration_ms']),
-                    'duration_ms': track['duration_ms'],
+                    **self._make_track_info(
+                        track,
+                        artist=_join_artists(track['artists'], artist_cache),
+                        album_name=album['name']
+                    ),
                     'track_number': track['track_number']
                 }
                 tracks.append(track_info)
@@ -169,7 +442,7 @@ class SpotifyClient:
             album_info = {
                 'id': album['id'],
                 'name': album['name'],
-                'artist': ', '.join([artist['name'] for artist in album['artists']]),
+                'artist': _artist_names(album['artists']),
                 'tracks': tracks,
                 'total_tracks': album['total_tracks'],
                 'release_date': album['release_date'],
@@ -185,7 +458,7 @@ class SpotifyClient:
             logger.error(f"Error retrieving album info for {album_id}: {e}")
             return None
     
-    async def search_track(self, query: str, limit: int = 10) -> List[Dict]:
+    async def _fetch_search_results(self, query: str, limit: int) -> List[Dict]:
         """
         Search for tracks on Spotify.
         
@@ -201,22 +474,12 @@ class SpotifyClient:
             return []
             
         try:
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                None, 
-                lambda: self.sp.search(q=query, type='track', limit=limit)
-            )
+            results = await self._call(self.sp.search, q=query, type='track', limit=limit)
             
             tracks = []
             for track in results['tracks']['items']:
                 track_info = {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                    'album': track['album']['name'],
-                    'duration': self._format_duration(track['duration_ms']),
-                    'duration_ms': track['duration_ms'],
-                    'popularity': track['popularity'],
+                    **self._make_track_info(track),
                     'external_urls': track['external_urls']
                 }
                 tracks.append(track_info)
@@ -228,10 +491,37 @@ class SpotifyClient:
             logger.error(f"Error searching tracks for query '{query}': {e}")
             return []
     
-    def _format_duration(self, duration_ms: int) -> str:
+    @staticmethod
+    def _make_track_info(track: Dict, artist: Optional[str] = None, album_name: Optional[str] = None) -> Dict:
+        """
+        Build the common track information dictionary.
+        
+        Args:
+            track: Spotify track object
+            artist: Precomputed artist string, joined from the track's artists if omitted
+            album_name: Album name, for track objects that don't embed their album
+            
+        Returns:
+            Dictionary with the fields shared by every track listing
+        """
+        return {
+            'id': track['id'],
+            'name': track['name'],
+            'artist': _artist_names(track['artists']) if artist is None else artist,
+            'album': track['album']['name'] if album_name is None else album_name,
+            'duration': SpotifyClient._format_duration(track['duration_ms']),
+            'duration_ms': track['duration_ms'],
+            'popularity': track.get('popularity', 0)
+        }
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _format_duration(duration_ms: int) -> str:
         """
         Format duration from milliseconds to MM:SS format.
         
+        Cached, since many tracks share the same length.
+        
         Args:
             duration_ms: Duration in milliseconds
             
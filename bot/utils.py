@@ -5,12 +5,39 @@ Contains helper functions for the Telegram music bot.
 
 import re
 import logging
+from functools import lru_cache
 from typing import List, Tuple, Optional
 from telegram import InlineKeyboardButton
 from config import QUALITY_OPTIONS
 
 logger = logging.getLogger(__name__)
 
+# Matches both web links (spotify.com/track/ID) and URIs (spotify:track:ID)
+SPOTIFY_URL_RE = re.compile(r'(?:spotify\.com/|spotify:)(?P<type>track|playlist|album)[/:](?P<id>[a-zA-Z0-9]{22})')
+
+# A complete Spotify link or URI, optionally followed by a query string (?si=...)
+_VALID_SPOTIFY = re.compile(
+    r'(?:https?://open\.spotify\.com/(?:track|playlist|album)/[a-zA-Z0-9]{22}(?:\?.*)?'
+    r'|spotify:(?:track|playlist|album):[a-zA-Z0-9]{22})'
+)
+
+# Parenthesized or bracketed annotations such as "(Remastered)" or "[Live]"
+_PARENS_OR_BRACKETS = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+_WS = re.compile(r'\s+')
+
+# Characters invalid in file names, each mapped to an underscore
+_FS_TRANS = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+# Characters that need escaping in Telegram markdown, mapped to their escaped form
+_MD_TRANS = str.maketrans({c: f'\\{c}' for c in r'_*[]()~`>#+-=|{}.!'})
+
+# Prebuilt progress bar halves, sliced to the requested length
+_BAR_FULL = "█" * 32
+_BAR_EMPTY = "░" * 32
+
+# File size units, one per power of 1024
+_SIZE_NAMES = ("B", "KB", "MB", "GB")
+
 def extract_spotify_id(url: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Extract Spotify ID and content type from a Spotify URL.
@@ -22,35 +49,11 @@ def extract_spotify_id(url: str) -> Tuple[Optional[str], Optional[str]]:
         Tuple of (spotify_id, content_type) or (None, None) if invalid
     """
     try:
-        # Regular expression patterns for different Spotify URL formats
-        patterns = {
-            'track': r'spotify\.com/track/([a-zA-Z0-9]+)',
-            'playlist': r'spotify\.com/playlist/([a-zA-Z0-9]+)',
-            'album': r'spotify\.com/album/([a-zA-Z0-9]+)',
-        }
-        
-        # Also handle spotify: URI format
-        uri_patterns = {
-            'track': r'spotify:track:([a-zA-Z0-9]+)',
-            'playlist': r'spotify:playlist:([a-zA-Z0-9]+)',
-            'album': r'spotify:album:([a-zA-Z0-9]+)',
-        }
-        
-        # Try web URL patterns first
-        for content_type, pattern in patterns.items():
-            match = re.search(pattern, url)
-            if match:
-                spotify_id = match.group(1)
-                logger.info(f"Extracted {content_type} ID: {spotify_id}")
-                return spotify_id, content_type
-        
-        # Try URI patterns
-        for content_type, pattern in uri_patterns.items():
-            match = re.search(pattern, url)
-            if match:
-                spotify_id = match.group(1)
-                logger.info(f"Extracted {content_type} ID from URI: {spotify_id}")
-                return spotify_id, content_type
+        match = SPOTIFY_URL_RE.search(url)
+        if match:
+            spotify_id, content_type = match.group('id'), match.group('type')
+            logger.info(f"Extracted {content_type} ID: {spotify_id}")
+            return spotify_id, content_type
         
         logger.warning(f"No valid Spotify ID found in URL: {url}")
         return None, None
@@ -69,23 +72,13 @@ def create_quality_keyboard(track_id: str) -> List[List[InlineKeyboardButton]]:
     Returns:
         List of keyboard button rows
     """
-    keyboard = []
-    
-    # Add quality option buttons in rows of 2
-    quality_buttons = []
-    for quality_text, quality_value in QUALITY_OPTIONS.items():
-        button = InlineKeyboardButton(
-            quality_text, 
-            callback_data=f"quality_{quality_value}"
-        )
-        quality_buttons.append(button)
+    quality_buttons = [
+        InlineKeyboardButton(quality_text, callback_data=f"quality_{quality_value}")
+        for quality_text, quality_value in QUALITY_OPTIONS.items()
+    ]
     
-    # Arrange in rows of 2 buttons
-    for i in range(0, len(quality_buttons), 2):
-        if i + 1 < len(quality_buttons):
-            keyboard.append([quality_buttons[i], quality_buttons[i + 1]])
-        else:
-            keyboard.append([quality_buttons[i]])
+    # Arrange in rows of 2 buttons; slicing keeps the odd one out on its own row
+    keyboard = [quality_buttons[i:i + 2] for i in range(0, len(quality_buttons), 2)]
     
     # Add cancel button on its own row
     keyboard.append([InlineKeyboardButton("🚫 Cancel", callback_data="cancel_download")])
@@ -107,6 +100,7 @@ def create_main_keyboard() -> List[List[InlineKeyboardButton]]:
     
     return keyboard
 
+@lru_cache(maxsize=2048)
 def validate_spotify_url(url: str) -> bool:
     """
     Validate if a URL is a valid Spotify URL.
@@ -117,16 +111,7 @@ def validate_spotify_url(url: str) -> bool:
     Returns:
         True if valid Spotify URL, False otherwise
     """
-    spotify_patterns = [
-        r'https?://open\.spotify\.com/(track|playlist|album)/[a-zA-Z0-9]+',
-        r'spotify:(track|playlist|album):[a-zA-Z0-9]+'
-    ]
-    
-    for pattern in spotify_patterns:
-        if re.match(pattern, url):
-            return True
-    
-    return False
+    return _VALID_SPOTIFY.fullmatch(url) is not None
 
 def format_file_size(size_bytes: int) -> str:
     """
@@ -141,15 +126,10 @@ def format_file_size(size_bytes: int) -> str:
     if size_bytes == 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    size_index = 0
-    size = float(size_bytes)
-    
-    while size >= 1024.0 and size_index < len(size_names) - 1:
-        size /= 1024.0
-        size_index += 1
+    # Each unit spans 10 bits, so the bit length picks the unit without looping
+    size_index = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_NAMES) - 1)
     
-    return f"{size:.1f} {size_names[size_index]}"
+    return f"{size_bytes / (1 << (size_index * 10)):.1f} {_SIZE_NAMES[size_index]}"
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -161,18 +141,8 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         Sanitized filename
     """
-    # Remove invalid characters for file systems
-    invalid_chars = r'[<>:"/\\|?*]'
-    sanitized = re.sub(invalid_chars, '_', filename)
-    
-    # Remove leading/trailing spaces and dots
-    sanitized = sanitized.strip(' .')
-    
-    # Limit length
-    if len(sanitized) > 200:
-        sanitized = sanitized[:200]
-    
-    return sanitized
+    # Replace invalid characters, trim spaces and dots, and limit length
+    return filename.translate(_FS_TRANS).strip(' .')[:200]
 
 def create_progress_bar(current: int, total: int, length: int = 10) -> str:
     """
@@ -181,18 +151,19 @@ def create_progress_bar(current: int, total: int, length: int = 10) -> str:
     Args:
         current: Current progress value
         total: Total value
-        length: Length of progress bar
+        length: Length of progress bar (at most 32)
         
     Returns:
         Progress bar string
     """
     if total == 0:
-        return "░" * length
+        return _BAR_EMPTY[:length]
     
     progress = min(current / total, 1.0)
     filled_length = int(length * progress)
     
-    bar = "█" * filled_length + "░" * (length - filled_length)
+    # Slice prebuilt bars instead of building new strings per tick
+    bar = _BAR_FULL[:filled_length] + _BAR_EMPTY[:length - filled_length]
     percentage = int(progress * 100)
     
     return f"{bar} {percentage}%"
@@ -236,13 +207,7 @@ def escape_markdown(text: str) -> str:
     Returns:
         Escaped text
     """
-    # Characters that need escaping in Telegram markdown
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    
-    for char in escape_chars:
-        text = text.replace(char, f'\\{char}')
-    
-    return text
+    return text.translate(_MD_TRANS)
 
 def create_search_query(track_name: str, artist_name: str) -> str:
     """
@@ -255,15 +220,11 @@ def create_search_query(track_name: str, artist_name: str) -> str:
     Returns:
         Optimized search query
     """
-    # Clean track name
-    track_clean = re.sub(r'\([^)]*\)', '', track_name)  # Remove parentheses content
-    track_clean = re.sub(r'\[[^\]]*\]', '', track_clean)  # Remove brackets content
-    track_clean = re.sub(r'\s+', ' ', track_clean).strip()  # Clean whitespace
+    # Clean track name: drop parentheses/brackets content, then collapse whitespace
+    track_clean = _WS.sub(' ', _PARENS_OR_BRACKETS.sub('', track_name)).strip()
     
     # Clean artist name
-    artist_clean = re.sub(r'\([^)]*\)', '', artist_name)
-    artist_clean = re.sub(r'\[[^\]]*\]', '', artist_clean)
-    artist_clean = re.sub(r'\s+', ' ', artist_clean).strip()
+    artist_clean = _WS.sub(' ', _PARENS_OR_BRACKETS.sub('', artist_name)).strip()
     
     # Create search query
     search_query = f"{track_clean} {artist_clean}"
@@ -15,6 +15,7 @@ SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 MAX_PLAYLIST_SIZE = 50  # Maximum number of songs to process from a playlist
 DOWNLOAD_TIMEOUT = 300  # 5 minutes timeout for downloads
 CONCURRENT_DOWNLOADS = 3  # Maximum concurrent downloads
+MAX_UPLOAD_SIZE = 49 * 1024 * 1024  # Telegram bots can upload at most 50 MB
 
 # Quality Options
 QUALITY_OPTIONS = {
@@ -58,10 +59,19 @@ BOT_HELP = """🎯 *How to use MusicFlow Bot:*
 
 💡 *Pro Tips:*
 • Processing time varies by content length
-• Playlists are processed sequentially
+• Playlist tracks are downloaded a few at a time
 • Use /start to return to main menu
 
 Need more help? Just ask! 😊"""
 
+# Filled with a track info dict via str.format_map
+BOT_TRACK_FOUND = """🎶 *Found your track!*
+
+🎤 **{name}**
+👨‍🎤 *by {artist}*
+⏱️ *Duration: {duration}*
+
+🎯 *Choose your preferred quality:*"""
+
 # Demo Songs Configuration
 DEMO_ROTATION_SIZE = 10  # Number of demo songs to rotate through